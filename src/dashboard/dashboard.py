@@ -6,8 +6,11 @@ import pandas as pd
 
 # import numpy as np
 import base64
+import os
+from concurrent.futures.process import BrokenProcessPool
 
 import utils
+import summary
 
 from streamlit_option_menu import option_menu
 
@@ -25,19 +28,88 @@ def page_upload_file():
             type=["csv", "txt", "xlsx"],
             accept_multiple_files=True,
         )
+        # Parse files in the background; the page reruns until they are ready
+        read_jobs = []
+        df = None
         if uploaded_files:
             for uploaded_file in uploaded_files:
-                df = utils.read_file(uploaded_file)
+                name = f"read_{uploaded_file.file_id}"
+                utils.submit_job(
+                    name, uploaded_file.file_id, utils.read_file, uploaded_file
+                )
+                read_jobs.append(name)
+                df = utils.job_result(name)
                 if df is not None:
                     st.write("Data Dimensions:", df.shape)
+        utils.cancel_stale_jobs("read_", read_jobs)
+
+        # Files larger than memory are queried in place by DuckDB instead.
+        # This is only offered when the server has a data directory configured
+        dataset_path = None
+        if os.environ.get(utils.DATA_DIR_VARIABLE):
+            dataset_path = st.text_input(
+                "Or open a CSV/Parquet file from the data directory (processed out-of-core with DuckDB)"
+            )
+        columns = None
+        if not uploaded_files and dataset_path:
+            try:
+                dataset_path, version = utils.resolve_data_path(dataset_path)
+                utils.submit_job(
+                    "describe_dataset",
+                    version,
+                    utils.describe_dataset,
+                    dataset_path,
+                    version,
+                )
+                description = utils.job_result("describe_dataset")
+            except ValueError as e:
+                st.error(str(e))
+                return
+            if description is None:
+                utils.wait_for_jobs(["describe_dataset"], "Reading file...")
+                return
+            df, shape, columns = description
+            st.write("Data Dimensions:", shape)
+
+        # Summaries are already aggregated and skip all row-level processing
+        summary_file = st.file_uploader("Or load a fairness summary", type=["json"])
+        if not uploaded_files and not dataset_path and summary_file:
+            data_key = ("summary", summary_file.file_id)
+            if st.session_state.get("data_key") != data_key:
+                try:
+                    fairness_summary = summary.FairnessSummary.from_json(
+                        summary_file.getvalue()
+                    )
+                except ValueError as e:
+                    st.error(f"Could not load {summary_file.name}: {e}")
+                    return
+                before_df, after_df = utils.split_data_by_date(
+                    fairness_summary, fairness_summary.metadata["split_date"]
+                )
+                utils.cancel_job("prepare_data")
+                st.session_state.df = fairness_summary
+                st.session_state.before_df = before_df
+                st.session_state.after_df = after_df
+                st.session_state.data_key = data_key
+            st.success(
+                f"Summary created on {st.session_state.df.metadata['created']} loaded!"
+            )
+            return
+
+    if uploaded_files or dataset_path:
+        if df is None:
+            with col1:
+                utils.wait_for_jobs(read_jobs, "Reading uploaded files...")
+            return
+        if columns is None:
+            columns = df.columns.tolist()
 
-    if uploaded_files:
         with (
             col1
         ):  # You might want to move these controls to another column if they are dependent on the file upload
             if st.checkbox("Preview DataFrame", key="preview"):
                 st.write("Preview of the DataFrame:")
-                st.write(df)
+                st.write(df if isinstance(df, pd.DataFrame) else df.head(100))
 
         # Decision processes based on DataFrame
         col5, col6 = st.columns([1, 2])
@@ -48,54 +120,29 @@ def page_upload_file():
         #     )
         with col5:
             default_index = (
-                df.columns.tolist().index("maternal_race")
-                if "maternal_race" in df.columns
-                else 0
+                columns.index("maternal_race") if "maternal_race" in columns else 0
             )
             sensitive_column = st.selectbox(
                 "Select sensitive column",
-                df.columns,
+                columns,
                 index=default_index,  # Set the default index
             )
         with col5:
             output_column = st.multiselect(
-                "Select output column", df.columns, default="cps_reporting_date"
+                "Select output column", columns, default="cps_reporting_date"
             )
 
-        # Further data processing
-        df["cps_reported"] = df[output_column].notna().astype(int)
-        drug_test_cols = [col for col in df.columns if "detected" in col]
-        df["uds_positive"] = df[drug_test_cols].any(axis=1).astype(int)
-        df["uds_ordered"] = df["uds_collection_date"].apply(
-            lambda x: 1 if pd.notnull(x) and x != "" else 0
-        )
-
         with col2:
             # st.header("Process File")
 
             remove_corrupted = st.checkbox(
                 "Remove bad data", value=True, key="remove_corrupted"
             )
-            if remove_corrupted:
-                df = utils.remove_corrupted_rows(df, "maternal_race")
-                st.success("Corrupted rows removed!")
-                st.write("Data Dimensions:", df.shape)
+            corrupted_status = st.empty()
 
         with col3:
-            outliers, outliers_encounter_id = utils.detect_outliers_iqr(
-                df, "maternal_age", 2.5
-            )
             remove = st.checkbox("Remove outliers", value=True, key="remove_outlier")
-            if remove:
-                df = utils.remove_rows_by_column_value(
-                    df, "encounter_id", outliers_encounter_id
-                )
-                st.success("Outliers removed!")
-                st.write("Data Dimensions:", df.shape)
-
-                st.markdown(
-                    '<hr style="border:2px solid gray">', unsafe_allow_html=True
-                )
+            outlier_status = st.empty()
 
             thresh = st.slider(
                 "Select minimum frequency of maternal race (%) to include rows. Slide to 0 for all data",
@@ -105,13 +152,61 @@ def page_upload_file():
             )
             st.write("Selected Threshold:", thresh, "%")
 
-            df = utils.filter_with_percentage(df, "maternal_race", thresh)
-            before_df, after_df = utils.split_data_by_date(df, "2028-03-01")
+        # Further data processing runs in the background; changing any of the
+        # inputs above cancels the previous job
+        files_key = tuple(f.file_id for f in uploaded_files) or version
+        utils.submit_job(
+            "prepare_data",
+            (files_key, tuple(output_column), remove_corrupted, remove, thresh),
+            utils.prepare_data,
+            df,
+            output_column,
+            remove_corrupted=remove_corrupted,
+            remove_outliers=remove,
+            thresh=thresh,
+            with_status=True,
+        )
+        result = utils.job_result("prepare_data")
+        if result is None:
+            with col2:
+                utils.wait_for_jobs(["prepare_data"], "Processing data...")
+            return
+
+        if remove_corrupted:
+            with corrupted_status.container():
+                st.success("Corrupted rows removed!")
+                st.write("Data Dimensions:", result["shapes"]["corrupted"])
+        if remove:
+            with outlier_status.container():
+                st.success("Outliers removed!")
+                st.write("Data Dimensions:", result["shapes"]["outliers"])
+
+                st.markdown(
+                    '<hr style="border:2px solid gray">', unsafe_allow_html=True
+                )
+
+        # Store dataframes in session state
+        store_prepared_data()
 
-            # Store dataframes in session state
-            st.session_state.df = df
-            st.session_state.before_df = before_df
-            st.session_state.after_df = after_df
+
+def store_prepared_data():
+    """
+    Copy the result of a finished prepare_data job into the session state.
+
+    Called on every run so the result is picked up even if the user left the
+    Upload page while the job was running.
+    """
+    job = st.session_state.get("jobs", {}).get("prepare_data")
+    if job is None or job["key"] == st.session_state.get("data_key"):
+        return
+    result = utils.job_result("prepare_data")
+    if result is None:
+        return
+
+    st.session_state.df = result["df"]
+    st.session_state.before_df = result["before_df"]
+    st.session_state.after_df = result["after_df"]
+    st.session_state.data_key = job["key"]
 
 
 def page_explore_data():
@@ -202,6 +297,16 @@ def page_explore_data():
 
     utils.add_custom_css()
 
+    # One binned pass per grouping feeds both the overall and grouped histograms
+    distribution = None
+    if not isinstance(df, summary.FairnessSummary):
+        stratify = st.selectbox(
+            "Compare maternal age by",
+            list(utils.AGE_STRATA),
+            format_func=utils.AGE_STRATA.get,
+        )
+        distribution = get_age_distribution(df, stratify)
+
     # Create responsive columns
     col1, col2 = st.columns(2)
 
@@ -209,7 +314,12 @@ def page_explore_data():
         # if st.checkbox("Maternal Age Distribution"):
         st.subheader("Maternal Age Distribution")
         # bin_size = st.slider("Bin Size", min_value=1, max_value=10, value=3)
-        utils.create_histogram(df["maternal_age"], bin_size=2)
+        if distribution is None:
+            st.info("Fairness summaries do not include the age distribution.")
+        elif distribution["counts"].empty:
+            st.info("No rows with a maternal age are left after processing.")
+        else:
+            st.plotly_chart(utils.create_age_histogram(distribution))
 
     with col2:
         # if st.checkbox("View Race Distribution"):
@@ -219,6 +329,39 @@ def page_explore_data():
         )
         st.plotly_chart(fig)
 
+    if distribution is None or distribution["counts"].empty:
+        return
+
+    st.subheader(f"Maternal Age by {utils.AGE_STRATA[stratify]}")
+    col1, col2 = st.columns(2)
+    with col1:
+        normalize = st.checkbox("Show percentage of each group", value=True)
+        fig = utils.create_stratified_histogram(
+            distribution["counts"], normalize=normalize
+        )
+        st.plotly_chart(fig)
+    with col2:
+        st.write(distribution["quantiles"])
+
+
+def get_age_distribution(df, stratify):
+    """
+    Return utils.age_distribution of the current data.
+
+    Computed once per dataset and grouping, so reruns (e.g. toggling the
+    percentage checkbox) reuse the counts.
+    """
+    data_key = st.session_state.get("data_key")
+    cache = st.session_state.get("age_distributions")
+    if cache is None or cache["data_key"] != data_key:
+        cache = {"data_key": data_key, "distributions": {}}
+        st.session_state.age_distributions = cache
+    if stratify not in cache["distributions"]:
+        cache["distributions"][stratify] = utils.age_distribution(
+            df, stratify, bin_size=2
+        )
+    return cache["distributions"][stratify]
+
 
 def page_track_fairness():
     # st.title("Insights")
@@ -252,10 +395,37 @@ def page_track_fairness():
         st.warning("Please select a time period.")
         return
 
-    # Calculate fairness metrics
-    result_df = utils.calculate_fairness_metrics(
-        df=selected_df, sensitive_column="maternal_race"
+    # Calculate fairness metrics in the background
+    data_key = st.session_state.get("data_key")
+    utils.submit_job(
+        "metrics_selected",
+        (data_key, time_period),
+        utils.calculate_fairness_metrics,
+        df=selected_df,
+        sensitive_column="maternal_race",
+        with_status=True,
     )
+    metric_jobs = ["metrics_selected"]
+    if time_period == "Post-Intervention":
+        # The delta compares against the pre-intervention period
+        for name, period_df in [
+            ("metrics_before", st.session_state.before_df),
+            ("metrics_after", st.session_state.after_df),
+        ]:
+            utils.submit_job(
+                name,
+                data_key,
+                utils.calculate_fairness_metrics,
+                df=period_df,
+                sensitive_column="maternal_race",
+                with_status=True,
+            )
+            metric_jobs.append(name)
+
+    result_df = utils.job_result("metrics_selected")
+    if result_df is None:
+        utils.wait_for_jobs(metric_jobs, "Calculating fairness metrics...")
+        return
     result_df = result_df.sort_values(by="Total Count", ascending=False)
 
     st.write(result_df)
@@ -268,26 +438,23 @@ def page_track_fairness():
     ].values[0]
     demographic_parity_ratio = black_ordered_total_pct / white_ordered_total_pct
 
-    before_result_df = utils.calculate_fairness_metrics(
-        df=st.session_state.before_df, sensitive_column="maternal_race"
-    )
-    after_result_df = utils.calculate_fairness_metrics(
-        df=st.session_state.after_df, sensitive_column="maternal_race"
-    )
-    demographic_parity_before = utils.demographic_parity(
-        before_result_df, "Black or African American", "White"
-    )
-    demographic_parity_after = utils.demographic_parity(
-        after_result_df, "Black or African American", "White"
-    )
     delta = None
     if time_period == "Post-Intervention":
-        delta = (
-            (demographic_parity_before - demographic_parity_after)
-            * 100
-            / demographic_parity_before
-        )
-        delta = format(delta, ".2f")
+        before_result_df = utils.job_result("metrics_before")
+        after_result_df = utils.job_result("metrics_after")
+        if before_result_df is not None and after_result_df is not None:
+            demographic_parity_before = utils.demographic_parity(
+                before_result_df, "Black or African American", "White"
+            )
+            demographic_parity_after = utils.demographic_parity(
+                after_result_df, "Black or African American", "White"
+            )
+            delta = (
+                (demographic_parity_before - demographic_parity_after)
+                * 100
+                / demographic_parity_before
+            )
+            delta = format(delta, ".2f")
 
     st.metric(
         label="Demographic Parity Ratio",
@@ -355,6 +522,138 @@ def page_track_fairness():
     if time_period == "Post-Intervention":
         utils.plot_order_indication_counts(st.session_state.after_df)
 
+    # Share the aggregated results without the encounter rows
+    df = st.session_state.df
+    if isinstance(df, summary.FairnessSummary):
+        fairness_summary = df
+    else:
+        utils.submit_job("summary", data_key, utils.build_summary, df)
+        metric_jobs.append("summary")
+        fairness_summary = utils.job_result("summary")
+    if fairness_summary is not None:
+        st.sidebar.download_button(
+            "Download fairness summary",
+            fairness_summary.to_json(),
+            file_name="fairness_summary.json",
+            mime="application/json",
+        )
+
+    # Rerun until the remaining metrics (e.g. the parity delta) are available
+    utils.wait_for_jobs(metric_jobs, "Calculating fairness metrics...")
+
+
+def page_compare_sites():
+
+    col1, col2 = st.columns([2, 2])
+
+    with col1:
+        uploaded_files = st.file_uploader(
+            "Upload one file per site (raw data or fairness summary)",
+            type=["csv", "txt", "xlsx", "json"],
+            accept_multiple_files=True,
+            key="site_files",
+        )
+
+    with col2:
+        remove_corrupted = st.checkbox(
+            "Remove bad data", value=True, key="site_remove_corrupted"
+        )
+        remove = st.checkbox("Remove outliers", value=True, key="site_remove_outlier")
+        thresh = st.slider(
+            "Select minimum frequency of maternal race (%) to include rows. Slide to 0 for all data",
+            0,
+            100,
+            3,
+            key="site_thresh",
+        )
+
+    if not uploaded_files:
+        st.info("Upload the data of two or more sites to compare them.")
+        return
+
+    # Each site runs in its own worker process; a site is only recomputed when
+    # its file or the settings change
+    site_jobs = {}
+    for uploaded_file in uploaded_files:
+        # Sites are labelled by file name, numbered if the same name repeats
+        site = uploaded_file.name
+        copies = 1
+        while site in site_jobs:
+            copies += 1
+            site = f"{uploaded_file.name} ({copies})"
+        name = f"site_{uploaded_file.file_id}"
+        site_jobs[site] = name
+        try:
+            utils.submit_job(
+                name,
+                (uploaded_file.file_id, remove_corrupted, remove, thresh),
+                utils.run_site_pipeline,
+                uploaded_file.name,
+                uploaded_file.getvalue(),
+                ["cps_reporting_date"],
+                remove_corrupted=remove_corrupted,
+                remove_outliers=remove,
+                thresh=thresh,
+                executor=utils.get_process_executor(),
+            )
+        except BrokenProcessPool as e:
+            # A worker died (e.g. out of memory); the next run starts a new pool
+            utils.get_process_executor.clear()
+            utils.cancel_job(name)
+            st.error(f"Could not process {site}: {e}")
+    utils.cancel_stale_jobs("site_", list(site_jobs.values()))
+
+    # A site that fails is reported on its own; the other sites are still shown
+    site_results = {}
+    for site, name in site_jobs.items():
+        try:
+            result = utils.job_result(name)
+        except BrokenProcessPool as e:
+            # Forget the job so the site is retried on a new pool
+            utils.get_process_executor.clear()
+            utils.cancel_job(name)
+            st.error(f"Could not process {site}: {e}")
+            continue
+        except Exception as e:
+            st.error(f"Could not process {site}: {e}")
+            continue
+        if result is not None:
+            site_results[site] = result
+
+    time_period = st.sidebar.radio(
+        "Select Time Period:",
+        ("All Time", "Pre-Intervention", "Post-Intervention"),
+        key="site_time_period",
+    )
+
+    if site_results:
+        merged_df = utils.merge_site_metrics(site_results, time_period)
+        st.write(merged_df)
+
+        st.subheader("Demographic Parity Ratio by Site")
+        parity = pd.DataFrame(
+            {
+                period: utils.site_parity(
+                    utils.merge_site_metrics(site_results, period),
+                    "Black or African American",
+                    "White",
+                )
+                for period in ("All Time", "Pre-Intervention", "Post-Intervention")
+            }
+        )
+        st.write(parity)
+        fig = px.bar(
+            parity.reset_index(),
+            x="site",
+            y=time_period,
+            labels={time_period: "Demographic Parity Ratio", "site": "Site"},
+            color_discrete_sequence=["#009999"],
+        )
+        fig.add_hline(y=1, line=dict(color="red", dash="dash"))
+        st.plotly_chart(fig)
+
+    utils.wait_for_jobs(list(site_jobs.values()), "Processing sites...")
+
 
 def main():
     st.set_page_config(
@@ -370,10 +669,12 @@ def main():
     if "after_df" not in st.session_state:
         st.session_state.after_df = None
 
+    store_prepared_data()
+
     selected = option_menu(
         menu_title=None,
-        options=["Upload", "Explore", "Insights"],
-        icons=["cloud-upload", "bar-chart", "lightbulb"],
+        options=["Upload", "Explore", "Insights", "Sites"],
+        icons=["cloud-upload", "bar-chart", "lightbulb", "hospital"],
         orientation="horizontal",
     )
 
@@ -383,6 +684,8 @@ def main():
         page_explore_data()
     if selected == "Insights":
         page_track_fairness()
+    if selected == "Sites":
+        page_compare_sites()
 
 
 if __name__ == "__main__":
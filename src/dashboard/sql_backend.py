@@ -0,0 +1,506 @@
+"""
+DuckDB backend for datasets that do not fit in memory.
+
+An SQLDataset is a lazily evaluated query over local CSV/Parquet files. The
+functions below mirror their pandas counterparts in utils.py and give the same
+results, but push the filtering and aggregation down to DuckDB so only the
+aggregated rows are loaded into pandas. The utils functions dispatch here when
+they are given an SQLDataset instead of a DataFrame. prepare_data writes the
+cleaned rows to a temporary Parquet file once, so later queries do not re-parse
+the raw extract.
+
+duckdb is only needed when this backend is used.
+"""
+
+import os
+import tempfile
+import weakref
+
+import pandas as pd
+
+import summary
+
+
+def _quote(name):
+    """
+    Quote a column name for use in SQL.
+    """
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _literal(value):
+    """
+    Quote a string value for use in SQL.
+    """
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _remove_file(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class _TempFile:
+    """
+    A temporary file, deleted once no dataset refers to it any more.
+    """
+
+    def __init__(self, suffix):
+        fd, self.path = tempfile.mkstemp(prefix="fairlabs_", suffix=suffix)
+        os.close(fd)
+        weakref.finalize(self, _remove_file, self.path)
+
+
+class SQLDataset:
+    """
+    A lazily evaluated DuckDB query used in place of a DataFrame.
+
+    Every query runs on its own in-memory connection, so datasets can be used
+    from the background executor threads.
+
+    Attributes:
+        query (str): SELECT statement producing the rows of the dataset.
+        files (tuple): Temporary files read by the query, kept alive with it.
+    """
+
+    def __init__(self, query, files=()):
+        self.query = query
+        self.files = files
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Create a dataset reading a local CSV, TXT (tab separated) or Parquet file.
+
+        Parameters:
+            path (str): Path to the file. Glob patterns are allowed.
+
+        Returns:
+            dataset (SQLDataset): The dataset.
+
+        Raises:
+            ValueError: If the file type is not supported or cannot be read.
+        """
+        import duckdb
+
+        file_extension = str(path).split(".")[-1].lower()
+        if file_extension == "parquet":
+            source = f"read_parquet({_literal(path)})"
+        elif file_extension == "csv":
+            source = f"read_csv_auto({_literal(path)})"
+        elif file_extension == "txt":
+            source = f"read_csv_auto({_literal(path)}, delim='\\t')"
+        else:
+            raise ValueError(f"Unsupported file type: {file_extension}")
+
+        dataset = cls(f"SELECT * FROM {source}")
+        try:
+            dataset.columns
+        except duckdb.Error as e:
+            message = str(e).splitlines()[0]
+            raise ValueError(f"Could not read {path}: {message}") from e
+        return dataset
+
+    def run(self, sql):
+        """
+        Run a complete SQL statement in which the dataset is the view `data`.
+
+        Returns:
+            result (DataFrame): The query result.
+        """
+        import duckdb
+
+        con = duckdb.connect()
+        try:
+            con.execute(f"CREATE VIEW data AS {self.query}")
+            return con.execute(sql).df()
+        finally:
+            con.close()
+
+    def where(self, condition):
+        """
+        Return a new dataset with the rows matching an SQL condition.
+        """
+        return SQLDataset(f"SELECT * FROM ({self.query}) WHERE {condition}", self.files)
+
+    def materialize(self):
+        """
+        Write the rows of the dataset to a temporary Parquet file.
+
+        Returns:
+            dataset (SQLDataset): A dataset reading the Parquet file.
+        """
+        import duckdb
+
+        parquet = _TempFile(".parquet")
+        con = duckdb.connect()
+        try:
+            con.execute(
+                f"COPY ({self.query}) TO {_literal(parquet.path)} (FORMAT PARQUET)"
+            )
+        finally:
+            con.close()
+        return SQLDataset(
+            f"SELECT * FROM read_parquet({_literal(parquet.path)})", (parquet,)
+        )
+
+    @property
+    def columns(self):
+        return self.run("SELECT * FROM data LIMIT 0").columns
+
+    @property
+    def shape(self):
+        rows = self.run("SELECT COUNT(*) AS n FROM data")["n"].iloc[0]
+        return int(rows), len(self.columns)
+
+    def head(self, n=5):
+        return self.run(f"SELECT * FROM data LIMIT {int(n)}")
+
+    def value_counts(self, column):
+        """
+        Number of rows per value of a column, like Series.value_counts.
+        """
+        counts = self.run(f"""
+            SELECT {_quote(column)}, COUNT(*) AS count FROM data
+            WHERE {_quote(column)} IS NOT NULL
+            GROUP BY {_quote(column)} ORDER BY count DESC
+            """)
+        return counts.set_index(column)["count"]
+
+
+def add_derived_columns(dataset, output_column):
+    """
+    SQL version of utils.add_derived_columns.
+    """
+    if len(output_column) != 1:
+        raise ValueError("Exactly one output column is supported")
+    drug_test_cols = [col for col in dataset.columns if "detected" in col]
+    uds_positive = " OR ".join(
+        f"COALESCE(TRY_CAST({_quote(col)} AS DOUBLE) <> 0, false)"
+        for col in drug_test_cols
+    )
+    uds_collection_date = _quote("uds_collection_date")
+    return SQLDataset(
+        f"""
+        SELECT *,
+            CAST({_quote(output_column[0])} IS NOT NULL AS INTEGER) AS cps_reported,
+            CAST({uds_positive or "false"} AS INTEGER) AS uds_positive,
+            CASE WHEN {uds_collection_date} IS NOT NULL
+                AND CAST({uds_collection_date} AS VARCHAR) <> ''
+                THEN 1 ELSE 0 END AS uds_ordered
+        FROM ({dataset.query})
+        """,
+        dataset.files,
+    )
+
+
+def remove_corrupted_rows(dataset, column_name):
+    """
+    SQL version of utils.remove_corrupted_rows.
+    """
+    return dataset.where(f"NOT regexp_matches({_quote(column_name)}, '\\r|\\n')")
+
+
+def remove_outliers_iqr(dataset, column, multiplier=1.5):
+    """
+    Remove the encounters flagged by utils.detect_outliers_iqr.
+    """
+    col = _quote(column)
+    bounds = dataset.run(f"""
+        SELECT quantile_cont({col}, 0.25) AS q1,
+            quantile_cont({col}, 0.75) AS q3,
+            COUNT(*) - COUNT({col}) AS missing
+        FROM data
+        """).iloc[0]
+    # np.percentile returns NaN when values are missing, so nothing is removed
+    if bounds["missing"] > 0 or pd.isna(bounds["q1"]):
+        return dataset
+
+    iqr = bounds["q3"] - bounds["q1"]
+    lower_bound = bounds["q1"] - multiplier * iqr
+    upper_bound = bounds["q3"] + multiplier * iqr
+    return dataset.where(f"""encounter_id NOT IN (
+            SELECT encounter_id FROM ({dataset.query})
+            WHERE ({col} < {lower_bound} OR {col} > {upper_bound})
+                AND encounter_id IS NOT NULL
+        ) OR encounter_id IS NULL""")
+
+
+def filter_with_percentage(dataset, column, percent_thresh):
+    """
+    SQL version of utils.filter_with_percentage.
+    """
+    return dataset.where(f"""{_quote(column)} IN (
+            SELECT maternal_race FROM ({dataset.query})
+            WHERE maternal_race IS NOT NULL
+            GROUP BY maternal_race
+            HAVING COUNT(*) * 100.0 / (SELECT COUNT(*) FROM ({dataset.query}))
+                > {float(percent_thresh)}
+        )""")
+
+
+def split_data_by_date(dataset, split_date="2028-03-01"):
+    """
+    SQL version of utils.split_data_by_date.
+    """
+    delivery_date = "CAST(delivery_date AS TIMESTAMP)"
+    split = f"CAST({_literal(split_date)} AS TIMESTAMP)"
+    before = dataset.where(f"{delivery_date} < {split}")
+    after = dataset.where(f"{delivery_date} >= {split}")
+    return before, after
+
+
+def prepare_data(
+    dataset,
+    output_column,
+    remove_corrupted=True,
+    remove_outliers=True,
+    thresh=3,
+    split_date="2028-03-01",
+    *,
+    status,
+):
+    """
+    SQL version of utils.prepare_data.
+
+    status is the utils.JobStatus of the job, updated between the stages.
+    """
+    status.update(0 / 5, "Deriving columns")
+    dataset = add_derived_columns(dataset, output_column)
+    shapes = {}
+
+    status.update(1 / 5, "Removing bad data")
+    if remove_corrupted:
+        dataset = remove_corrupted_rows(dataset, "maternal_race")
+    # The raw extract is parsed only here; the other steps read the Parquet file
+    dataset = dataset.materialize()
+    if remove_corrupted:
+        shapes["corrupted"] = dataset.shape
+
+    status.update(2 / 5, "Removing outliers")
+    if remove_outliers:
+        dataset = remove_outliers_iqr(dataset, "maternal_age", 2.5)
+        shapes["outliers"] = dataset.shape
+
+    status.update(3 / 5, "Filtering rare groups")
+    dataset = filter_with_percentage(dataset, "maternal_race", thresh)
+    dataset = dataset.materialize()
+
+    status.update(4 / 5, "Splitting by date")
+    before, after = split_data_by_date(dataset, split_date)
+    status.update(1, "Done")
+
+    return {"df": dataset, "before_df": before, "after_df": after, "shapes": shapes}
+
+
+def _period(split_date):
+    """
+    SQL expression labelling every row with one of summary.PERIODS, or NULL.
+    """
+    delivery_date = "CAST(delivery_date AS TIMESTAMP)"
+    split = f"CAST({_literal(split_date)} AS TIMESTAMP)"
+    before, after = (_literal(period) for period in summary.PERIODS)
+    return f"""CASE WHEN {delivery_date} < {split} THEN {before}
+        WHEN {delivery_date} >= {split} THEN {after} END"""
+
+
+def build_summary(
+    dataset,
+    sensitive_column="maternal_race",
+    split_date="2028-03-01",
+    truth_col="uds_positive",
+    predicted_col="uds_ordered",
+):
+    """
+    SQL version of summary.FairnessSummary.from_dataframe.
+    """
+    group = _quote(sensitive_column)
+    truth = _quote(truth_col)
+    predicted = _quote(predicted_col)
+    periods = f"""
+        WITH periods AS (SELECT *, {_period(split_date)} AS period FROM data)
+        """
+    cells = dataset.run(f"""{periods}
+        SELECT {group}, period, order_indication,
+            COUNT(*) AS n,
+            SUM(CASE WHEN {truth} = 1 AND {predicted} = 1 THEN 1 ELSE 0 END) AS tp,
+            SUM(CASE WHEN {truth} = 0 AND {predicted} = 0 THEN 1 ELSE 0 END) AS tn,
+            SUM(CASE WHEN {truth} = 0 AND {predicted} = 1 THEN 1 ELSE 0 END) AS fp,
+            SUM(CASE WHEN {truth} = 1 AND {predicted} = 0 THEN 1 ELSE 0 END) AS fn,
+            SUM(cps_reported) AS cps_reported
+        FROM periods
+        GROUP BY ALL
+        ORDER BY ALL NULLS LAST
+        """)
+    cells[summary.COUNT_COLUMNS] = cells[summary.COUNT_COLUMNS].astype(int)
+
+    distinct = dataset.run(f"""{periods}
+        SELECT 'All Time' AS period,
+            COUNT(DISTINCT mother_id) AS mothers,
+            COUNT(DISTINCT encounter_id) AS encounters
+        FROM periods
+        UNION ALL
+        SELECT period, COUNT(DISTINCT mother_id), COUNT(DISTINCT encounter_id)
+        FROM periods
+        WHERE period IS NOT NULL
+        GROUP BY period
+        """).set_index("period")
+    row_counts = {
+        period: [
+            distinct.loc[period, "mothers"] if period in distinct.index else 0,
+            distinct.loc[period, "encounters"] if period in distinct.index else 0,
+        ]
+        for period in ("All Time",) + summary.PERIODS
+    }
+
+    return summary.FairnessSummary.from_counts(
+        cells, row_counts, sensitive_column, split_date
+    )
+
+
+def _age_group(by, split_date):
+    """
+    SQL expression for utils.age_groups.
+    """
+    if by == "period":
+        return _period(split_date)
+    if by == "tested":
+        return "CASE uds_ordered WHEN 1 THEN 'Tested' WHEN 0 THEN 'Not tested' END"
+    return _quote(by)
+
+
+def age_distribution(
+    dataset, by, bin_size=2, split_date="2028-03-01", age_column="maternal_age"
+):
+    """
+    SQL version of utils.age_distribution.
+    """
+    ages = f"""
+        WITH ages AS (
+            SELECT {_age_group(by, split_date)} AS grp, {_quote(age_column)} AS age
+            FROM data
+        ),
+        valid AS (SELECT * FROM ages WHERE grp IS NOT NULL AND age IS NOT NULL)
+        """
+    binned = dataset.run(
+        f"""{ages}, bounds AS (SELECT floor(min(age)) AS start FROM valid)
+        SELECT grp, start,
+            CAST(floor((age - start) / {float(bin_size)}) AS INTEGER) AS bin,
+            COUNT(*) AS n
+        FROM valid, bounds
+        GROUP BY grp, start, bin
+        """
+    )
+    if binned.empty:
+        return {
+            "counts": pd.DataFrame(),
+            "quantiles": pd.DataFrame(),
+            "bin_size": bin_size,
+        }
+
+    start = binned["start"].iloc[0]
+    counts = binned.pivot(index="grp", columns="bin", values="n")
+    counts = counts.reindex(columns=range(binned["bin"].max() + 1)).sort_index()
+    counts = counts.fillna(0).astype(int).rename_axis(by).rename_axis(None, axis=1)
+    counts.columns = start + bin_size * counts.columns.to_numpy()
+
+    quantiles = dataset.run(f"""{ages}
+        SELECT grp, COUNT(age) AS count, AVG(age) AS mean,
+            quantile_cont(age, 0.25) AS "25%",
+            quantile_cont(age, 0.5) AS "50%",
+            quantile_cont(age, 0.75) AS "75%"
+        FROM valid
+        GROUP BY grp
+        ORDER BY grp
+        """)
+    quantiles = quantiles.set_index("grp").rename_axis(by)
+    return {"counts": counts, "quantiles": quantiles, "bin_size": bin_size}
+
+
+def get_counts(dataset):
+    """
+    SQL version of utils.get_counts.
+    """
+    counts = dataset.run("""
+        SELECT COUNT(DISTINCT mother_id) AS mothers,
+            COUNT(DISTINCT encounter_id) AS encounters,
+            COALESCE(SUM(uds_ordered), 0) AS uds_ordered,
+            COALESCE(SUM(uds_positive), 0) AS positive_cases,
+            COALESCE(SUM(cps_reported), 0) AS cps_reported
+        FROM data
+        """).iloc[0]
+    return tuple(int(value) for value in counts)
+
+
+def calculate_fairness_metrics(
+    dataset, sensitive_column, truth_col="uds_positive", predicted_col="uds_ordered"
+):
+    """
+    SQL version of utils.calculate_fairness_metrics.
+
+    DuckDB computes the confusion counts per group; the rates are derived from
+    them in pandas exactly as in the in-memory version.
+    """
+    group = _quote(sensitive_column)
+    truth = _quote(truth_col)
+    predicted = _quote(predicted_col)
+    counts = dataset.run(f"""
+        WITH race AS (
+            SELECT maternal_race AS grp,
+                COUNT(uds_ordered) AS total_count,
+                SUM(uds_ordered) AS ordered_count,
+                SUM(CASE WHEN uds_ordered = 1 THEN uds_positive END) AS positive_count
+            FROM data
+            WHERE maternal_race IS NOT NULL
+            GROUP BY maternal_race
+        ),
+        metrics AS (
+            SELECT {group} AS grp,
+                SUM(CASE WHEN {truth} = 1 AND {predicted} = 1 THEN 1 ELSE 0 END) AS tp,
+                SUM(CASE WHEN {truth} = 0 AND {predicted} = 0 THEN 1 ELSE 0 END) AS tn,
+                SUM(CASE WHEN {truth} = 0 AND {predicted} = 1 THEN 1 ELSE 0 END) AS fp,
+                SUM(CASE WHEN {truth} = 1 AND {predicted} = 0 THEN 1 ELSE 0 END) AS fn,
+                AVG({predicted}) AS proportion_positive
+            FROM data
+            WHERE {group} IS NOT NULL
+            GROUP BY {group}
+        )
+        SELECT metrics.*, race.total_count, race.ordered_count, race.positive_count
+        FROM metrics LEFT JOIN race ON metrics.grp = race.grp
+        ORDER BY metrics.grp
+        """)
+
+    tp, tn, fp, fn = (counts[c].astype(int) for c in ["tp", "tn", "fp", "fn"])
+    has_race = counts["total_count"].notna()
+    total_count = counts["total_count"].fillna(0).astype(int)
+    ordered_count = counts["ordered_count"].fillna(0).astype(int)
+    positive_count = counts["positive_count"].fillna(0).astype(int)
+    percent_ordered = (ordered_count / total_count * 100).where(has_race, 0)
+    # Groups without ordered tests get NaN, as with the aligned pandas division
+    percent_positive = (
+        (positive_count / ordered_count * 100)
+        .where(ordered_count > 0)
+        .where(has_race, 0)
+    )
+
+    result_df = pd.DataFrame(
+        {
+            sensitive_column: counts["grp"],
+            "Total Count": total_count,
+            "Ordered Count": ordered_count,
+            "(Ordered/Total) %": percent_ordered,
+            "Positive Count": positive_count,
+            "(Positive/Ordered) %": percent_positive,
+            "tp": tp,
+            "tn": tn,
+            "fp": fp,
+            "fn": fn,
+            "proportion_positive": counts["proportion_positive"],
+            "tpr": (tp / (tp + fn)).where(tp + fn > 0, 0),
+            "tnr": (tn / (tn + fp)).where(tn + fp > 0, 0),
+            "fpr": (fp / (fp + tn)).where(fp + tn > 0, 0),
+            "ppp": (tp + fp) / (tp + fp + tn + fn),
+        }
+    )
+
+    return result_df
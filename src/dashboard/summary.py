@@ -0,0 +1,282 @@
+"""
+Compact, shareable fairness summaries.
+
+A FairnessSummary stores the confusion counts of a processed dataset aggregated
+by group, period and order indication, plus the row-level counts the dashboard
+needs (distinct mothers and encounters). It is saved as a small versioned JSON
+document without any encounter rows, so results can be shared and compared
+across sites. The utils functions dispatch here when given a FairnessSummary,
+like they do for sql_backend.SQLDataset.
+"""
+
+import json
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+FORMAT_NAME = "fairlabs-summary"
+FORMAT_VERSION = 1
+
+PERIODS = ("Pre-Intervention", "Post-Intervention")
+COUNT_COLUMNS = ["n", "tp", "tn", "fp", "fn", "cps_reported"]
+GROUP_COLUMNS = ["maternal_race", "period", "order_indication"]
+METADATA_KEYS = ["created", "sensitive_column", "split_date", "row_counts"]
+
+
+def label_periods(dates, split_date="2028-03-01"):
+    """
+    Label every delivery date with one of PERIODS.
+
+    Parameters:
+        dates (Series): Delivery dates.
+        split_date (str): Date separating pre- and post-intervention data.
+
+    Returns:
+        periods (ndarray): Period labels, None where the date is missing.
+    """
+    dates = pd.to_datetime(dates)
+    return np.select(
+        [dates < split_date, dates >= split_date], list(PERIODS), default=None
+    )
+
+
+class FairnessSummary:
+    """
+    Aggregated confusion-count cube used in place of a DataFrame.
+
+    Attributes:
+        cells (DataFrame): One row per group, period and order indication with
+            the columns in COUNT_COLUMNS.
+        metadata (dict): Format information, split date, sensitive column and
+            the distinct mother/encounter counts per period.
+        period (str): Period the summary is restricted to, or None for all time.
+    """
+
+    def __init__(self, cells, metadata, period=None):
+        self.cells = cells
+        self.metadata = metadata
+        self.period = period
+
+    @classmethod
+    def from_dataframe(
+        cls,
+        df,
+        sensitive_column="maternal_race",
+        split_date="2028-03-01",
+        truth_col="uds_positive",
+        predicted_col="uds_ordered",
+    ):
+        """
+        Build a summary from a processed DataFrame (see utils.prepare_data).
+
+        Returns:
+            summary (FairnessSummary): The summary of all the data.
+        """
+        period = label_periods(df["delivery_date"], split_date)
+        truth = df[truth_col]
+        predicted = df[predicted_col]
+        counts = pd.DataFrame(
+            {
+                sensitive_column: df[sensitive_column],
+                "period": period,
+                "order_indication": df["order_indication"],
+                "n": 1,
+                "tp": ((truth == 1) & (predicted == 1)).astype(int),
+                "tn": ((truth == 0) & (predicted == 0)).astype(int),
+                "fp": ((truth == 0) & (predicted == 1)).astype(int),
+                "fn": ((truth == 1) & (predicted == 0)).astype(int),
+                "cps_reported": df["cps_reported"],
+            }
+        )
+        cells = (
+            counts.groupby(
+                [sensitive_column, "period", "order_indication"], dropna=False
+            )[COUNT_COLUMNS]
+            .sum()
+            .reset_index()
+        )
+
+        # Distinct counts do not add up across cells, so they are stored per period
+        row_counts = {"All Time": [df.mother_id.nunique(), df.encounter_id.nunique()]}
+        for name in PERIODS:
+            rows = df[period == name]
+            row_counts[name] = [rows.mother_id.nunique(), rows.encounter_id.nunique()]
+
+        return cls.from_counts(cells, row_counts, sensitive_column, split_date)
+
+    @classmethod
+    def from_counts(cls, cells, row_counts, sensitive_column, split_date):
+        """
+        Build a summary from already aggregated cells.
+
+        Parameters:
+            cells (DataFrame): Counts per group, period and order indication.
+            row_counts (dict): Distinct [mothers, encounters] per period and for
+                "All Time".
+            sensitive_column (str): Group column of the cells.
+            split_date (str): Date separating the periods.
+
+        Returns:
+            summary (FairnessSummary): The summary of all the data.
+        """
+        metadata = {
+            "format": FORMAT_NAME,
+            "version": FORMAT_VERSION,
+            "created": date.today().isoformat(),
+            "sensitive_column": sensitive_column,
+            "split_date": split_date,
+            "row_counts": {k: [int(v) for v in c] for k, c in row_counts.items()},
+        }
+        return cls(cells, metadata)
+
+    def to_json(self):
+        """
+        Serialize the summary (all periods) to a JSON string.
+        """
+        cells = json.loads(self.cells.to_json(orient="split", index=False))
+        return json.dumps(
+            {
+                "metadata": self.metadata,
+                "columns": cells["columns"],
+                "cells": cells["data"],
+            },
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def from_json(cls, text):
+        """
+        Load a summary written by to_json.
+
+        Raises:
+            ValueError: If the document is not valid JSON, not a supported
+                summary, or lacks the columns and metadata the dashboard uses.
+        """
+        document = json.loads(text)
+        metadata = document.get("metadata") if isinstance(document, dict) else None
+        if not isinstance(metadata, dict) or metadata.get("format") != FORMAT_NAME:
+            raise ValueError("Not a fairness summary file")
+        if metadata.get("version") != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported fairness summary version: {metadata.get('version')}"
+            )
+        missing = [key for key in METADATA_KEYS if key not in metadata]
+        if missing:
+            raise ValueError(f"Fairness summary metadata is missing {missing}")
+        row_counts = metadata["row_counts"]
+        if not isinstance(row_counts, dict) or any(
+            not isinstance(row_counts.get(name), list) or len(row_counts[name]) != 2
+            for name in ("All Time",) + PERIODS
+        ):
+            raise ValueError("Malformed fairness summary row counts")
+        try:
+            cells = pd.DataFrame(document["cells"], columns=document["columns"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError("Malformed fairness summary file") from e
+        required = [metadata["sensitive_column"]] + GROUP_COLUMNS + COUNT_COLUMNS
+        missing = [column for column in required if column not in cells.columns]
+        if missing:
+            raise ValueError(f"Fairness summary cells are missing {missing}")
+        try:
+            cells[COUNT_COLUMNS] = cells[COUNT_COLUMNS].astype(int)
+        except (TypeError, ValueError) as e:
+            raise ValueError("Malformed fairness summary counts") from e
+        return cls(cells, metadata)
+
+    def for_period(self, period):
+        """
+        Return the summary restricted to one of PERIODS.
+        """
+        return FairnessSummary(
+            self.cells[self.cells["period"] == period], self.metadata, period
+        )
+
+    def value_counts(self, column):
+        """
+        Number of rows per value of a grouping column, like Series.value_counts.
+        """
+        counts = self.cells.groupby(column)["n"].sum()
+        counts = counts[counts > 0].sort_values(ascending=False)
+        return counts.rename("count")
+
+
+def split_data_by_date(summary, split_date="2028-03-01"):
+    """
+    Summary version of utils.split_data_by_date.
+    """
+    if split_date != summary.metadata["split_date"]:
+        raise ValueError(
+            f"Summary was split at {summary.metadata['split_date']}, not {split_date}"
+        )
+    return summary.for_period(PERIODS[0]), summary.for_period(PERIODS[1])
+
+
+def get_counts(summary):
+    """
+    Summary version of utils.get_counts.
+    """
+    mothers, encounters = summary.metadata["row_counts"][summary.period or "All Time"]
+    totals = summary.cells[COUNT_COLUMNS].sum()
+    uds_ordered = totals["tp"] + totals["fp"]
+    positive_cases = totals["tp"] + totals["fn"]
+    return (
+        mothers,
+        encounters,
+        int(uds_ordered),
+        int(positive_cases),
+        int(totals["cps_reported"]),
+    )
+
+
+def calculate_fairness_metrics(
+    summary, sensitive_column, truth_col="uds_positive", predicted_col="uds_ordered"
+):
+    """
+    Summary version of utils.calculate_fairness_metrics.
+
+    Only the default truth and predicted columns are available, grouped by the
+    sensitive column of the summary or by order indication.
+    """
+    if (truth_col, predicted_col) != ("uds_positive", "uds_ordered"):
+        raise ValueError("Summaries only store uds_positive/uds_ordered counts")
+
+    race = summary.cells.groupby("maternal_race")[COUNT_COLUMNS].sum()
+    counts = summary.cells.groupby(sensitive_column)[COUNT_COLUMNS].sum()
+    counts = counts[counts["n"] > 0]
+    tp, tn, fp, fn = (counts[c] for c in ["tp", "tn", "fp", "fn"])
+
+    # Ordered/positive counts are always taken per maternal race, as in utils
+    has_race = counts.index.isin(race.index)
+    race = race.reindex(counts.index)
+    total_count = race["n"].fillna(0).astype(int)
+    ordered_count = (race["tp"] + race["fp"]).fillna(0).astype(int)
+    positive_count = race["tp"].fillna(0).astype(int)
+    percent_ordered = (ordered_count / total_count * 100).where(has_race, 0)
+    percent_positive = (
+        (positive_count / ordered_count * 100)
+        .where(ordered_count > 0)
+        .where(has_race, 0)
+    )
+
+    result_df = pd.DataFrame(
+        {
+            sensitive_column: counts.index,
+            "Total Count": total_count,
+            "Ordered Count": ordered_count,
+            "(Ordered/Total) %": percent_ordered,
+            "Positive Count": positive_count,
+            "(Positive/Ordered) %": percent_positive,
+            "tp": tp,
+            "tn": tn,
+            "fp": fp,
+            "fn": fn,
+            "proportion_positive": (tp + fp) / counts["n"],
+            "tpr": (tp / (tp + fn)).where(tp + fn > 0, 0),
+            "tnr": (tn / (tn + fp)).where(tn + fp > 0, 0),
+            "fpr": (fp / (fp + tn)).where(fp + tn > 0, 0),
+            "ppp": (tp + fp) / (tp + fp + tn + fn),
+        }
+    ).reset_index(drop=True)
+
+    return result_df
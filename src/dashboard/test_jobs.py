@@ -0,0 +1,89 @@
+import os
+import time
+
+import pandas as pd
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import utils
+
+DATA_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "..", "data", "raw", "fairlabs_data.csv"
+)
+
+
+def jobs_app():
+    import time
+
+    import streamlit as st
+
+    import utils
+
+    def wait_until_cancelled(key, status):
+        # Reports progress until cancelled, giving up after a few seconds
+        for _ in range(500):
+            status.update(0.5, "Waiting")
+            time.sleep(0.01)
+        return key
+
+    key = st.session_state.get("key", 1)
+    st.session_state.future = utils.submit_job(
+        "job", key, wait_until_cancelled, key, with_status=True
+    )
+    st.session_state.result = utils.job_result("job")
+
+
+def wait_until_running(future):
+    for _ in range(500):
+        if future.running() or future.done():
+            return
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def at():
+    at = AppTest.from_function(jobs_app).run()
+    yield at
+    # Stop the job still running on the shared executor
+    at.session_state["jobs"]["job"]["status"].cancelled.set()
+
+
+def test_same_inputs_reuse_the_job(at):
+    future = at.session_state["future"]
+    at.run()
+
+    assert at.session_state["future"] is future
+
+
+def test_new_inputs_cancel_the_running_job(at):
+    future = at.session_state["future"]
+    wait_until_running(future)
+    at.session_state["key"] = 2
+    at.run()
+
+    assert at.session_state["future"] is not future
+    with pytest.raises(utils.JobCancelled):
+        future.result(timeout=5)
+
+
+def test_cancelled_job_has_no_result(at):
+    future = at.session_state["future"]
+    wait_until_running(future)
+    at.session_state["jobs"]["job"]["status"].cancelled.set()
+    with pytest.raises(utils.JobCancelled):
+        future.result(timeout=5)
+    at.run()
+
+    assert not at.exception
+    assert at.session_state["future"] is future
+    assert at.session_state["result"] is None
+
+
+def test_cancelled_status_stops_prepare_data():
+    status = utils.JobStatus()
+    status.cancelled.set()
+
+    with pytest.raises(utils.JobCancelled):
+        utils.prepare_data(
+            pd.read_csv(DATA_PATH), ["cps_reporting_date"], status=status
+        )
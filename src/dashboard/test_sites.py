@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils
+
+DATA_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "..", "data", "raw", "fairlabs_data.csv"
+)
+OUTPUT_COLUMN = ["cps_reporting_date"]
+PERIODS = ["All Time", "Pre-Intervention", "Post-Intervention"]
+GROUPS = ("Black or African American", "White")
+
+
+@pytest.fixture(scope="module")
+def site_files():
+    raw_df = pd.read_csv(DATA_PATH)
+    half = raw_df.sample(frac=0.5, random_state=0)
+    return {
+        "site_a.csv": raw_df.to_csv(index=False).encode(),
+        "site_b.csv": half.to_csv(index=False).encode(),
+    }
+
+
+@pytest.fixture(scope="module")
+def site_results(site_files):
+    return {
+        site: utils.run_site_pipeline(site, data, OUTPUT_COLUMN)
+        for site, data in site_files.items()
+    }
+
+
+def test_raw_site_matches_prepared_data(site_results):
+    raw_df = pd.read_csv(DATA_PATH)
+    prepared = utils.prepare_data(raw_df, OUTPUT_COLUMN)
+
+    for period, key in zip(PERIODS, ["df", "before_df", "after_df"]):
+        pd.testing.assert_frame_equal(
+            site_results["site_a.csv"][period],
+            utils.calculate_fairness_metrics(prepared[key], "maternal_race"),
+        )
+
+
+def test_summary_site_matches_raw_site(site_results):
+    prepared = utils.prepare_data(pd.read_csv(DATA_PATH), OUTPUT_COLUMN)
+    text = utils.build_summary(prepared["df"]).to_json()
+    result = utils.run_site_pipeline("site_a.json", text.encode(), OUTPUT_COLUMN)
+
+    for period in PERIODS:
+        pd.testing.assert_frame_equal(
+            result[period],
+            site_results["site_a.csv"][period].reset_index(drop=True),
+            check_dtype=False,
+        )
+
+
+def test_merged_metrics_have_site_column(site_results):
+    merged_df = utils.merge_site_metrics(site_results, "All Time")
+
+    assert merged_df.columns[0] == "site"
+    assert set(merged_df["site"]) == set(site_results)
+    assert len(merged_df) == sum(
+        len(metrics["All Time"]) for metrics in site_results.values()
+    )
+
+
+@pytest.mark.parametrize("period", PERIODS)
+def test_site_parity_matches_each_site(site_results, period):
+    parity = utils.site_parity(utils.merge_site_metrics(site_results, period), *GROUPS)
+
+    for site, metrics in site_results.items():
+        assert parity[site] == pytest.approx(
+            utils.demographic_parity(metrics[period], *GROUPS)
+        )
+
+
+def test_site_parity_is_nan_without_group(site_results):
+    merged_df = utils.merge_site_metrics(site_results, "All Time")
+    merged_df = merged_df[
+        (merged_df["site"] == "site_a.csv") | (merged_df["maternal_race"] != "White")
+    ]
+    parity = utils.site_parity(merged_df, *GROUPS)
+
+    assert not np.isnan(parity["site_a.csv"])
+    assert np.isnan(parity["site_b.csv"])
@@ -0,0 +1,139 @@
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("duckdb")
+
+import sql_backend
+import summary
+import utils
+
+DATA_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "..", "data", "raw", "fairlabs_data.csv"
+)
+OUTPUT_COLUMN = ["cps_reporting_date"]
+
+
+@pytest.fixture(scope="module")
+def raw_df():
+    return pd.read_csv(DATA_PATH)
+
+
+@pytest.mark.parametrize(
+    "remove_corrupted, remove_outliers, thresh",
+    [(True, True, 3), (False, False, 0), (True, False, 10)],
+)
+def test_sql_backend_matches_pandas(raw_df, remove_corrupted, remove_outliers, thresh):
+    settings = dict(
+        remove_corrupted=remove_corrupted,
+        remove_outliers=remove_outliers,
+        thresh=thresh,
+    )
+    expected = utils.prepare_data(raw_df, OUTPUT_COLUMN, **settings)
+    dataset = sql_backend.SQLDataset.from_file(DATA_PATH)
+    result = utils.prepare_data(dataset, OUTPUT_COLUMN, **settings)
+
+    assert result["shapes"] == expected["shapes"]
+    for key in ["df", "before_df", "after_df"]:
+        assert utils.get_counts(result[key]) == utils.get_counts(expected[key])
+        for column in ["maternal_race", "order_indication"]:
+            pd.testing.assert_frame_equal(
+                utils.calculate_fairness_metrics(result[key], column),
+                utils.calculate_fairness_metrics(expected[key], column).reset_index(
+                    drop=True
+                ),
+                check_dtype=False,
+            )
+            assert (
+                utils.value_counts(result[key], column).to_dict()
+                == utils.value_counts(expected[key], column).to_dict()
+            )
+
+
+def test_prepared_data_does_not_reparse_raw_file():
+    dataset = sql_backend.SQLDataset.from_file(DATA_PATH)
+    result = utils.prepare_data(dataset, OUTPUT_COLUMN)
+
+    for key in ["df", "before_df", "after_df"]:
+        assert "read_csv" not in result[key].query
+        assert result[key].query.count("read_parquet") == 1
+
+
+def test_from_file_rejects_bad_paths(tmp_path):
+    with pytest.raises(ValueError):
+        sql_backend.SQLDataset.from_file(str(tmp_path / "data.xlsx"))
+    with pytest.raises(ValueError):
+        sql_backend.SQLDataset.from_file(str(tmp_path / "missing.csv"))
+
+
+def test_sql_summary_matches_pandas(raw_df):
+    expected = utils.build_summary(utils.prepare_data(raw_df, OUTPUT_COLUMN)["df"])
+    dataset = sql_backend.SQLDataset.from_file(DATA_PATH)
+    result = utils.build_summary(utils.prepare_data(dataset, OUTPUT_COLUMN)["df"])
+
+    assert result.metadata["row_counts"] == expected.metadata["row_counts"]
+    for period in [None, "Pre-Intervention", "Post-Intervention"]:
+        if period is not None:
+            result_period = result.for_period(period)
+            expected_period = expected.for_period(period)
+        else:
+            result_period, expected_period = result, expected
+        assert utils.get_counts(result_period) == utils.get_counts(expected_period)
+        pd.testing.assert_frame_equal(
+            utils.calculate_fairness_metrics(result_period, "maternal_race"),
+            utils.calculate_fairness_metrics(expected_period, "maternal_race"),
+            check_dtype=False,
+        )
+
+
+@pytest.mark.parametrize("by", ["maternal_race", "period", "tested"])
+def test_sql_age_distribution_matches_pandas(raw_df, by):
+    expected = utils.age_distribution(
+        utils.prepare_data(raw_df, OUTPUT_COLUMN)["df"], by
+    )
+    dataset = sql_backend.SQLDataset.from_file(DATA_PATH)
+    result = utils.age_distribution(
+        utils.prepare_data(dataset, OUTPUT_COLUMN)["df"], by
+    )
+
+    pd.testing.assert_frame_equal(
+        result["counts"], expected["counts"], check_dtype=False
+    )
+    pd.testing.assert_frame_equal(
+        result["quantiles"], expected["quantiles"], check_dtype=False
+    )
+    if by == "period":
+        assert list(result["counts"].index) == list(summary.PERIODS)
+        assert list(result["quantiles"].index) == list(summary.PERIODS)
+
+
+@pytest.mark.parametrize("backend", ["pandas", "sql"])
+def test_age_histogram_of_empty_data(raw_df, backend):
+    if backend == "sql":
+        data = sql_backend.SQLDataset.from_file(DATA_PATH)
+        data = utils.prepare_data(data, OUTPUT_COLUMN)["df"].where("FALSE")
+    else:
+        data = utils.prepare_data(raw_df, OUTPUT_COLUMN)["df"].iloc[:0]
+    distribution = utils.age_distribution(data, "period")
+
+    assert distribution["counts"].empty
+    utils.create_age_histogram(distribution)
+
+
+def test_local_paths_stay_in_data_directory(tmp_path, monkeypatch):
+    (tmp_path / "data.csv").write_text("a,b\n1,2\n")
+    monkeypatch.delenv(utils.DATA_DIR_VARIABLE, raising=False)
+    with pytest.raises(ValueError):
+        utils.resolve_data_path("data.csv")
+
+    monkeypatch.setenv(utils.DATA_DIR_VARIABLE, str(tmp_path))
+    path, version = utils.resolve_data_path("data.csv")
+    assert path == str((tmp_path / "data.csv").resolve())
+    for outside in ["../data.csv", DATA_PATH, os.path.join("..", "*", "*.csv")]:
+        with pytest.raises(ValueError):
+            utils.resolve_data_path(outside)
+
+    # Replacing the file changes its version, so cached results are not reused
+    (tmp_path / "data.csv").write_text("a,b\n1,2\n3,4\n")
+    assert utils.resolve_data_path("data.csv")[1] != version
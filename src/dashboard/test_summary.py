@@ -0,0 +1,91 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import summary
+import utils
+
+DATA_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "..", "data", "raw", "fairlabs_data.csv"
+)
+
+
+@pytest.fixture(scope="module")
+def prepared():
+    raw_df = pd.read_csv(DATA_PATH)
+    return utils.prepare_data(raw_df, ["cps_reporting_date"])
+
+
+def test_summary_round_trip_matches_rows(prepared):
+    text = utils.build_summary(prepared["df"]).to_json()
+    fairness_summary = summary.FairnessSummary.from_json(text)
+    before, after = utils.split_data_by_date(fairness_summary)
+
+    for rows, cube in [
+        (prepared["df"], fairness_summary),
+        (prepared["before_df"], before),
+        (prepared["after_df"], after),
+    ]:
+        assert utils.get_counts(cube) == utils.get_counts(rows)
+        pd.testing.assert_frame_equal(
+            utils.calculate_fairness_metrics(cube, "maternal_race"),
+            utils.calculate_fairness_metrics(rows, "maternal_race").reset_index(
+                drop=True
+            ),
+            check_dtype=False,
+        )
+
+
+def summary_text(drop_column=None, drop_metadata=None, drop_period=None):
+    """
+    A minimal valid summary document, optionally with a part removed.
+    """
+    columns = ["maternal_race", "period", "order_indication"] + summary.COUNT_COLUMNS
+    cells = [["White", "Pre-Intervention", "Other", 2, 1, 1, 0, 0, 0]]
+    row_counts = {"All Time": [2, 2], "Pre-Intervention": [2, 2]}
+    row_counts["Post-Intervention"] = [0, 0]
+    metadata = {
+        "format": "fairlabs-summary",
+        "version": 1,
+        "created": "2024-01-01",
+        "sensitive_column": "maternal_race",
+        "split_date": "2028-03-01",
+        "row_counts": row_counts,
+    }
+    if drop_column is not None:
+        index = columns.index(drop_column)
+        columns.pop(index)
+        cells = [cell[:index] + cell[index + 1 :] for cell in cells]
+    metadata.pop(drop_metadata, None)
+    row_counts.pop(drop_period, None)
+    return json.dumps({"metadata": metadata, "columns": columns, "cells": cells})
+
+
+def test_from_json_loads_minimal_summary():
+    fairness_summary = summary.FairnessSummary.from_json(summary_text())
+    assert utils.get_counts(fairness_summary) == (2, 2, 1, 1, 0)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "not json",
+        "[1, 2]",
+        '{"metadata": {"format": "other"}}',
+        '{"metadata": {"format": "fairlabs-summary", "version": 99}}',
+        '{"metadata": {"format": "fairlabs-summary", "version": 1}}',
+        summary_text(drop_column="period"),
+        summary_text(drop_column="maternal_race"),
+        summary_text(drop_column="order_indication"),
+        summary_text(drop_column="tp"),
+        summary_text(drop_metadata="split_date"),
+        summary_text(drop_metadata="created"),
+        summary_text(drop_metadata="row_counts"),
+        summary_text(drop_period="Pre-Intervention"),
+    ],
+)
+def test_from_json_rejects_other_files(text):
+    with pytest.raises(ValueError):
+        summary.FairnessSummary.from_json(text)
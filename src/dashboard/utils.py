@@ -1,9 +1,20 @@
+import glob
+import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import streamlit as st
 import plotly.graph_objs as go
 
+import sql_backend
+import summary
+
 
 def read_file(uploaded_file):
     file_extension = uploaded_file.name.split(".")[-1].lower()
@@ -97,6 +108,8 @@ def value_counts_with_percentage(df, column):
 
 
 def filter_with_percentage(data, column, percent_thresh):
+    if isinstance(data, sql_backend.SQLDataset):
+        return sql_backend.filter_with_percentage(data, column, percent_thresh)
     freq_df = value_counts_with_percentage(data, "maternal_race")
     filtered_df = data[
         data[column].isin(freq_df[freq_df["percentage"] > percent_thresh].index)
@@ -105,6 +118,10 @@ def filter_with_percentage(data, column, percent_thresh):
 
 
 def split_data_by_date(data, split_date="2028-03-01"):
+    if isinstance(data, summary.FairnessSummary):
+        return summary.split_data_by_date(data, split_date)
+    if isinstance(data, sql_backend.SQLDataset):
+        return sql_backend.split_data_by_date(data, split_date)
     before_df = data[pd.to_datetime(data["delivery_date"]) < split_date]
     after_df = data[pd.to_datetime(data["delivery_date"]) >= split_date]
     # st.write(before_df.shape, after_df.shape, data.shape)
@@ -126,7 +143,7 @@ def create_pie_chart(df, column, colors=None, width=600, height=400):
     fig (plotly.graph_objs._figure.Figure): The Plotly figure object.
     """
     # Calculate the frequency of each unique value in the column
-    freq_df = df[column].value_counts().reset_index()
+    freq_df = value_counts(df, column).reset_index()
     freq_df.columns = [column, "Count"]
 
     # Create the pie chart
@@ -183,32 +200,131 @@ def create_pie_charts(dataframe, column_name, index, colors=None):
     return fig
 
 
-def create_histogram(data, bin_size=3, width=600, height=400):
+AGE_STRATA = {
+    "maternal_race": "Maternal Race",
+    "period": "Time Period",
+    "tested": "UDS Ordered",
+}
+
+
+def age_groups(df, by, split_date="2028-03-01"):
+    """
+    Return the group label of every row for one of AGE_STRATA.
+
+    Parameters:
+        df (DataFrame): Processed data (see prepare_data).
+        by (str): Key of AGE_STRATA.
+        split_date (str): Date separating pre- and post-intervention data.
+
+    Returns:
+        groups (Series): Group labels, None where unknown.
+    """
+    if by == "period":
+        periods = summary.label_periods(df["delivery_date"], split_date)
+        return pd.Series(periods, index=df.index)
+    if by == "tested":
+        return df["uds_ordered"].map({1: "Tested", 0: "Not tested"})
+    return df[by]
+
+
+def age_distribution(
+    df, by, bin_size=2, split_date="2028-03-01", age_column="maternal_age"
+):
     """
-    Create a fancy interactive histogram.
+    Calculate the maternal age distribution of every group in a single pass.
+
+    All groups share the same bins so their histograms can be compared
+    directly.
 
     Parameters:
-        data (array-like): Data to plot.
+        df (DataFrame): Processed data (see prepare_data).
+        by (str): Key of AGE_STRATA.
         bin_size (int): Size of bins.
+        split_date (str): Date separating pre- and post-intervention data.
+        age_column (str): Column with the ages.
 
     Returns:
-        None
+        distribution (dict): "counts", a DataFrame of row counts with one row per
+        group and one column per bin (labelled by its lower edge), "quantiles",
+        a DataFrame with the count, mean and quartiles per group, and
+        "bin_size".
     """
+    if isinstance(df, sql_backend.SQLDataset):
+        distribution = sql_backend.age_distribution(
+            df, by, bin_size, split_date, age_column
+        )
+    else:
+        distribution = _age_distribution(df, by, bin_size, split_date, age_column)
 
-    fig = px.histogram(
-        data,
-        x=data,
-        nbins=int((data.max() - data.min()) / bin_size),
-        title="",
-        labels={"x": "Maternal Age", "y": "Frequency"},
-        color_discrete_sequence=["#009999"],
+    # Periods are listed in time order rather than alphabetically
+    if by == "period" and not distribution["counts"].empty:
+        order = [p for p in summary.PERIODS if p in distribution["counts"].index]
+        distribution["counts"] = distribution["counts"].loc[order]
+        distribution["quantiles"] = distribution["quantiles"].loc[order]
+    return distribution
+
+
+def _age_distribution(df, by, bin_size, split_date, age_column):
+    """
+    Pandas version of age_distribution.
+    """
+    data = pd.DataFrame(
+        {"group": age_groups(df, by, split_date), "age": df[age_column]}
+    ).dropna()
+    if data.empty:
+        return {
+            "counts": pd.DataFrame(),
+            "quantiles": pd.DataFrame(),
+            "bin_size": bin_size,
+        }
+
+    # Bin index and group code of every row, then one bincount over both
+    start = np.floor(data["age"].min())
+    bins = ((data["age"] - start) // bin_size).astype(int).to_numpy()
+    nbins = bins.max() + 1
+    codes, groups = pd.factorize(data["group"], sort=True)
+    counts = np.bincount(codes * nbins + bins, minlength=len(groups) * nbins)
+
+    counts = pd.DataFrame(
+        counts.reshape(len(groups), nbins),
+        index=pd.Index(groups, name=by),
+        columns=start + bin_size * np.arange(nbins),
     )
+    quantiles = data.groupby("group")["age"].describe()
+    quantiles = quantiles[["count", "mean", "25%", "50%", "75%"]].rename_axis(by)
+    return {"counts": counts, "quantiles": quantiles, "bin_size": bin_size}
+
 
-    # Update traces to add bar outlines
-    fig.update_traces(marker=dict(line=dict(color="black", width=1.5)))
+def create_age_histogram(distribution, width=600, height=400):
+    """
+    Create the overall age histogram from the output of age_distribution.
+
+    The group counts are summed per bin, so no rows are scanned again. Rows
+    without a group label are not included.
 
-    # Add a vertical line at the mean
-    fig.add_vline(x=data.mean(), line=dict(color="red", dash="dash"), name="Mean Age")
+    Parameters:
+        distribution (dict): Output of age_distribution.
+
+    Returns:
+        fig (plotly.graph_objs._figure.Figure): The Plotly figure object.
+    """
+    counts = distribution["counts"].sum(axis=0)
+    quantiles = distribution["quantiles"]
+    bin_size = distribution["bin_size"]
+
+    fig = go.Figure(
+        go.Bar(
+            x=counts.index.to_numpy(dtype=float) + bin_size / 2,
+            y=counts.to_numpy(),
+            width=bin_size,
+            marker=dict(color="#009999", line=dict(color="black", width=1.5)),
+        )
+    )
+
+    # Add a vertical line at the mean, unless there is no data at all
+    if not quantiles.empty:
+        mean = (quantiles["mean"] * quantiles["count"]).sum() / quantiles["count"].sum()
+        fig.add_vline(x=mean, line=dict(color="red", dash="dash"), name="Mean Age")
 
     # Update layout for better visualization
     fig.update_layout(
@@ -224,8 +340,54 @@ def create_histogram(data, bin_size=3, width=600, height=400):
         height=height,
     )
 
-    # Show the figure in Streamlit
-    st.plotly_chart(fig)
+    return fig
+
+
+def create_stratified_histogram(counts, normalize=True, width=600, height=400):
+    """
+    Create overlaid age histograms from the counts of age_distribution.
+
+    Parameters:
+        counts (DataFrame): Counts per group (rows) and age bin (columns).
+        normalize (bool): Plot the percentage of each group instead of counts,
+            so groups of different sizes can be compared.
+
+    Returns:
+        fig (plotly.graph_objs._figure.Figure): The Plotly figure object.
+    """
+    if normalize:
+        counts = counts.div(counts.sum(axis=1), axis=0) * 100
+    y_title = "Percentage of Group" if normalize else "Frequency"
+    bin_size = counts.columns[1] - counts.columns[0] if len(counts.columns) > 1 else 1
+
+    plot_df = counts.stack().rename(y_title).reset_index()
+    plot_df.columns = ["group", "age", y_title]
+    plot_df["age"] = plot_df["age"] + bin_size / 2
+
+    fig = px.bar(
+        plot_df,
+        x="age",
+        y=y_title,
+        color="group",
+        barmode="overlay",
+        opacity=0.6,
+        labels={"age": "Maternal Age", "group": ""},
+        color_discrete_sequence=["#009999", "#ec6602", "gray", "brown"],
+    )
+    fig.update_traces(width=bin_size)
+
+    fig.update_layout(
+        xaxis_title="Maternal Age",
+        yaxis_title=y_title,
+        xaxis_title_font_size=18,
+        yaxis_title_font_size=18,
+        plot_bgcolor="#cbcbcb",
+        margin=dict(l=20, r=20, t=40, b=20),
+        width=width,
+        height=height,
+    )
+
+    return fig
 
 
 def add_custom_css():
@@ -246,8 +408,21 @@ def add_custom_css():
 
 
 def calculate_fairness_metrics(
-    df, sensitive_column, truth_col="uds_positive", predicted_col="uds_ordered"
+    df,
+    sensitive_column,
+    truth_col="uds_positive",
+    predicted_col="uds_ordered",
+    status=None,
 ):
+    if isinstance(df, sql_backend.SQLDataset):
+        return sql_backend.calculate_fairness_metrics(
+            df, sensitive_column, truth_col, predicted_col
+        )
+    if isinstance(df, summary.FairnessSummary):
+        return summary.calculate_fairness_metrics(
+            df, sensitive_column, truth_col, predicted_col
+        )
+
     # Calculate count and percentage of uds_ordered
     ordered_count = df.groupby("maternal_race")["uds_ordered"].sum()
     total_count = df.groupby("maternal_race")["uds_ordered"].count()
@@ -282,7 +457,9 @@ def calculate_fairness_metrics(
     grouped = df.groupby(sensitive_column)
 
     # Calculate metrics for each group
-    for group, data in grouped:
+    for i, (group, data) in enumerate(grouped):
+        if status is not None:
+            status.update(i / grouped.ngroups, f"group {group}")
         tp = sum((data[truth_col] == 1) & (data[predicted_col] == 1))
         tn = sum((data[truth_col] == 0) & (data[predicted_col] == 0))
         fp = sum((data[truth_col] == 0) & (data[predicted_col] == 1))
@@ -328,7 +505,7 @@ def calculate_fairness_metrics(
 
 
 def plot_order_indication_counts(df):
-    order_counts = df["order_indication"].value_counts().reset_index()
+    order_counts = value_counts(df, "order_indication").reset_index()
     order_counts.columns = ["order_indication", "count"]
     order_counts = order_counts.sort_values(by="count", ascending=False)
 
@@ -359,6 +536,10 @@ def demographic_parity(df, group1, group2):
 
 
 def get_counts(df):
+    if isinstance(df, summary.FairnessSummary):
+        return summary.get_counts(df)
+    if isinstance(df, sql_backend.SQLDataset):
+        return sql_backend.get_counts(df)
     mothers = df.mother_id.nunique()
     encounters = df.encounter_id.nunique()
     uds_ordered = df.uds_ordered.sum()
@@ -367,6 +548,90 @@ def get_counts(df):
     return mothers, encounters, uds_ordered, positive_cases, cps_reported
 
 
+def build_summary(df, split_date="2028-03-01"):
+    """
+    Aggregate processed data into a shareable summary.FairnessSummary.
+
+    SQL datasets are aggregated by DuckDB without loading their rows.
+    """
+    if isinstance(df, sql_backend.SQLDataset):
+        return sql_backend.build_summary(df, split_date=split_date)
+    return summary.FairnessSummary.from_dataframe(df, split_date=split_date)
+
+
+DATA_DIR_VARIABLE = "FAIRLABS_DATA_DIR"
+
+
+def resolve_data_path(path):
+    """
+    Resolve a file path or glob pattern typed on the Upload page.
+
+    Paths are relative to the directory named by the FAIRLABS_DATA_DIR
+    environment variable and must stay inside it, so users can only open the
+    files the server makes available. Opening local files is disabled when the
+    variable is not set.
+
+    Returns:
+        path (str): Absolute path or pattern.
+        version (tuple): Name, modification time and size of every matching
+            file, which changes when a file is replaced.
+
+    Raises:
+        ValueError: If no data directory is configured, or the path is outside
+            it or matches no files.
+    """
+    data_dir = os.environ.get(DATA_DIR_VARIABLE)
+    if not data_dir:
+        raise ValueError(f"Set {DATA_DIR_VARIABLE} to open local files")
+    data_dir = os.path.realpath(data_dir)
+
+    full_path = os.path.realpath(os.path.join(data_dir, path))
+    files = sorted(glob.glob(full_path, recursive=True))
+    for name in [full_path] + files:
+        if os.path.commonpath([data_dir, os.path.realpath(name)]) != data_dir:
+            raise ValueError(f"{path} is outside the data directory")
+    if not files:
+        raise ValueError(f"No files match {path}")
+
+    version = tuple(
+        (name, os.path.getmtime(name), os.path.getsize(name)) for name in files
+    )
+    return full_path, version
+
+
+@st.cache_data
+def describe_dataset(path, version):
+    """
+    Open a local file with DuckDB and return it with its dimensions and columns.
+
+    The row count needs a full scan of the file, so call this on the background
+    executor (see submit_job). Results are cached per path and version (see
+    resolve_data_path), so a replaced file is scanned again.
+
+    Returns:
+        dataset (sql_backend.SQLDataset): The dataset.
+        shape (tuple): Number of rows and columns.
+        columns (list): Column names.
+
+    Raises:
+        ValueError: If the file type is not supported or cannot be read.
+    """
+    dataset = sql_backend.SQLDataset.from_file(path)
+    return dataset, dataset.shape, dataset.columns.tolist()
+
+
+def value_counts(data, column):
+    """
+    Count the rows per value of a column, like Series.value_counts.
+
+    Works for DataFrames, SQL datasets and fairness summaries, without loading
+    rows into memory for the latter two.
+    """
+    if isinstance(data, (sql_backend.SQLDataset, summary.FairnessSummary)):
+        return data.value_counts(column)
+    return data[column].value_counts()
+
+
 def remove_corrupted_rows(df, column_name):
     """
     Filter DataFrame to remove rows containing '\r' or '\n' in the specified column.
@@ -379,3 +644,350 @@ def remove_corrupted_rows(df, column_name):
     - Filtered DataFrame
     """
     return df[~df[column_name].str.contains(r"\r|\n")]
+
+
+def add_derived_columns(df, output_column):
+    """
+    Add the outcome columns used throughout the dashboard.
+
+    Parameters:
+        df (DataFrame): Raw encounter data.
+        output_column (list): Column(s) whose presence marks a CPS report.
+
+    Returns:
+        df (DataFrame): Copy of the data with cps_reported, uds_positive and
+        uds_ordered columns added.
+    """
+    df = df.copy()
+    df["cps_reported"] = df[output_column].notna().astype(int)
+    drug_test_cols = [col for col in df.columns if "detected" in col]
+    df["uds_positive"] = df[drug_test_cols].any(axis=1).astype(int)
+    df["uds_ordered"] = df["uds_collection_date"].apply(
+        lambda x: 1 if pd.notnull(x) and x != "" else 0
+    )
+    return df
+
+
+def prepare_data(
+    df,
+    output_column,
+    remove_corrupted=True,
+    remove_outliers=True,
+    thresh=3,
+    split_date="2028-03-01",
+    status=None,
+):
+    """
+    Run the upload page processing steps on a raw DataFrame.
+
+    This function does not touch Streamlit so it can run on the background
+    executor (see submit_job). SQLDataset inputs are processed by DuckDB.
+
+    Parameters:
+        df (DataFrame): Raw encounter data.
+        output_column (list): Column(s) whose presence marks a CPS report.
+        remove_corrupted (bool): Drop rows with line breaks in maternal_race.
+        remove_outliers (bool): Drop maternal_age outliers (IQR, multiplier 2.5).
+        thresh (int): Minimum maternal race frequency (%) to keep rows.
+        split_date (str): Date separating pre- and post-intervention data.
+        status (JobStatus): Receives the progress of each stage; the job stops
+            between stages once it is cancelled.
+
+    Returns:
+        result (dict): The processed df, before_df and after_df, plus the data
+        dimensions after each cleaning step.
+    """
+    if status is None:
+        status = JobStatus()
+    if isinstance(df, sql_backend.SQLDataset):
+        return sql_backend.prepare_data(
+            df,
+            output_column,
+            remove_corrupted,
+            remove_outliers,
+            thresh,
+            split_date,
+            status=status,
+        )
+
+    status.update(0 / 5, "Deriving columns")
+    df = add_derived_columns(df, output_column)
+    shapes = {}
+
+    status.update(1 / 5, "Removing bad data")
+    if remove_corrupted:
+        df = remove_corrupted_rows(df, "maternal_race")
+        shapes["corrupted"] = df.shape
+
+    status.update(2 / 5, "Removing outliers")
+    outliers, outliers_encounter_id = detect_outliers_iqr(df, "maternal_age", 2.5)
+    if remove_outliers:
+        df = remove_rows_by_column_value(df, "encounter_id", outliers_encounter_id)
+        shapes["outliers"] = df.shape
+
+    status.update(3 / 5, "Filtering rare groups")
+    df = filter_with_percentage(df, "maternal_race", thresh)
+
+    status.update(4 / 5, "Splitting by date")
+    before_df, after_df = split_data_by_date(df, split_date)
+    status.update(1, "Done")
+
+    return {"df": df, "before_df": before_df, "after_df": after_df, "shapes": shapes}
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a background job that has been cancelled.
+    """
+
+
+class JobStatus:
+    """
+    Progress and cancellation flag shared by a background job and the page.
+
+    Jobs call update between their stages; the page reads progress and stage
+    (see wait_for_jobs) and sets cancelled when the job is superseded.
+    """
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.progress = 0.0
+        self.stage = ""
+
+    def update(self, progress, stage):
+        """
+        Record the progress of the job, stopping it if it was cancelled.
+
+        Raises:
+            JobCancelled: If the job has been cancelled.
+        """
+        if self.cancelled.is_set():
+            raise JobCancelled()
+        self.progress = progress
+        self.stage = stage
+
+
+@st.cache_resource
+def get_executor(max_workers=4):
+    """
+    Return the thread pool shared by all sessions for long-running steps.
+    """
+    return ThreadPoolExecutor(max_workers=max_workers)
+
+
+@st.cache_resource
+def get_process_executor(max_workers=None):
+    """
+    Return the process pool used for CPU-heavy jobs such as per-site pipelines.
+
+    Workers are spawned rather than forked so they do not inherit the state of
+    the Streamlit server.
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def submit_job(name, inputs_key, fn, *args, executor=None, with_status=False, **kwargs):
+    """
+    Run fn on the background executor, once per set of inputs.
+
+    The job is tracked in the session state under name. Calling this again with
+    the same inputs_key reuses the existing job; a different inputs_key cancels
+    the previous job and submits a new one, so stale results are never returned.
+    Jobs that have not started yet are dropped; running jobs submitted
+    with_status stop at their next status update.
+
+    Parameters:
+        name (str): Identifier of the job within the session.
+        inputs_key (hashable): Value describing the inputs of the job.
+        fn (callable): Function to run. It must not call Streamlit.
+        executor (Executor): Executor to run fn on. Defaults to get_executor();
+            pass get_process_executor() for CPU-bound work (fn and its
+            arguments must then be picklable).
+        with_status (bool): Pass a JobStatus to fn as the status argument, for
+            progress reporting and cancellation of running jobs. Only for the
+            thread pool.
+
+    Returns:
+        future (concurrent.futures.Future): The future of the job.
+    """
+    if "jobs" not in st.session_state:
+        st.session_state.jobs = {}
+    jobs = st.session_state.jobs
+
+    job = jobs.get(name)
+    if job is not None:
+        if job["key"] == inputs_key:
+            return job["future"]
+        _cancel(job)
+
+    status = None
+    if with_status:
+        status = JobStatus()
+        kwargs["status"] = status
+    if executor is None:
+        executor = get_executor()
+    future = executor.submit(fn, *args, **kwargs)
+    jobs[name] = {"key": inputs_key, "future": future, "status": status}
+    return future
+
+
+def _cancel(job):
+    job["future"].cancel()
+    if job["status"] is not None:
+        job["status"].cancelled.set()
+
+
+def cancel_job(name):
+    """
+    Cancel a job and forget about it.
+    """
+    job = st.session_state.get("jobs", {}).pop(name, None)
+    if job is not None:
+        _cancel(job)
+
+
+def cancel_stale_jobs(prefix, names):
+    """
+    Cancel the jobs whose name starts with prefix and is not in names.
+
+    Used to drop the jobs of files that are no longer uploaded.
+    """
+    for name in list(st.session_state.get("jobs", {})):
+        if name.startswith(prefix) and name not in names:
+            cancel_job(name)
+
+
+def job_result(name):
+    """
+    Return the result of a finished job, or None while it is still running.
+
+    Exceptions raised by the job are re-raised here, in the script thread.
+    """
+    job = st.session_state.get("jobs", {}).get(name)
+    if job is None or job["future"].cancelled() or not job["future"].done():
+        return None
+    if isinstance(job["future"].exception(), JobCancelled):
+        return None
+    return job["future"].result()
+
+
+def wait_for_jobs(names, label="Processing...", poll_interval=0.5):
+    """
+    Show a progress bar for pending jobs and rerun the page until they finish.
+
+    Call this at the end of a page, after the partial results have been
+    rendered. It returns immediately when all jobs are done.
+
+    Parameters:
+        names (list): Names of the jobs to wait for.
+        label (str): Text shown next to the progress bar.
+        poll_interval (float): Seconds to wait before the next rerun.
+    """
+    jobs = st.session_state.get("jobs", {})
+    waiting = [jobs[name] for name in names if name in jobs]
+    pending = [job for job in waiting if not job["future"].done()]
+    if not pending:
+        return
+
+    # Finished jobs count fully, running ones by their reported progress
+    progress = 0
+    for job in waiting:
+        if job["future"].done():
+            progress += 1
+        elif job["status"] is not None:
+            progress += job["status"].progress
+    stages = [job["status"].stage for job in pending if job["status"] is not None]
+    if len(waiting) == 1 and stages:
+        label = f"{label} {stages[0]}"
+    st.progress(min(progress / len(waiting), 1.0), text=label)
+    time.sleep(poll_interval)
+    st.rerun()
+
+
+def run_site_pipeline(
+    name, data, output_column, remove_corrupted=True, remove_outliers=True, thresh=3
+):
+    """
+    Clean one site's data and calculate its fairness metrics for every period.
+
+    Runs in a worker process (see get_process_executor), so it takes the raw
+    file contents rather than the uploaded file object. Fairness summaries
+    (.json) are already processed and only go through the metric calculation.
+
+    Parameters:
+        name (str): File name, used to detect the file type.
+        data (bytes): File contents.
+        output_column (list): Column(s) whose presence marks a CPS report.
+        remove_corrupted (bool): Drop rows with line breaks in maternal_race.
+        remove_outliers (bool): Drop maternal_age outliers.
+        thresh (int): Minimum maternal race frequency (%) to keep rows.
+
+    Returns:
+        site_metrics (dict): Fairness metrics DataFrame per time period.
+    """
+    if name.lower().endswith(".json"):
+        df = summary.FairnessSummary.from_json(data)
+        before_df, after_df = split_data_by_date(df, df.metadata["split_date"])
+    else:
+        uploaded_file = io.BytesIO(data)
+        uploaded_file.name = name
+        result = prepare_data(
+            read_file(uploaded_file),
+            output_column,
+            remove_corrupted=remove_corrupted,
+            remove_outliers=remove_outliers,
+            thresh=thresh,
+        )
+        df, before_df, after_df = result["df"], result["before_df"], result["after_df"]
+
+    periods = {
+        "All Time": df,
+        "Pre-Intervention": before_df,
+        "Post-Intervention": after_df,
+    }
+    return {
+        period: calculate_fairness_metrics(period_df, sensitive_column="maternal_race")
+        for period, period_df in periods.items()
+    }
+
+
+def merge_site_metrics(site_results, period):
+    """
+    Combine the per-site fairness metrics of one period into a single table.
+
+    Parameters:
+        site_results (dict): run_site_pipeline results keyed by site name.
+        period (str): Time period to combine.
+
+    Returns:
+        merged_df (DataFrame): Fairness metrics with a leading site column.
+    """
+    tables = [
+        metrics[period].assign(site=site) for site, metrics in site_results.items()
+    ]
+    if not tables:
+        return pd.DataFrame()
+    merged_df = pd.concat(tables, ignore_index=True)
+    return merged_df[["site"] + [c for c in merged_df.columns if c != "site"]]
+
+
+def site_parity(merged_df, group1, group2):
+    """
+    Calculate the demographic parity ratio of every site.
+
+    Parameters:
+        merged_df (DataFrame): Output of merge_site_metrics.
+        group1 (str): Maternal race in the numerator.
+        group2 (str): Maternal race in the denominator.
+
+    Returns:
+        parity (Series): Parity ratio per site, NaN where a group is missing.
+    """
+    ordered_pct = merged_df.pivot_table(
+        index="site", columns="maternal_race", values="(Ordered/Total) %"
+    )
+    ordered_pct = ordered_pct.reindex(columns=[group1, group2])
+    parity = ordered_pct[group1] / ordered_pct[group2]
+    return parity.rename("Demographic Parity Ratio")